@@ -1,11 +1,16 @@
 """Main entry point for logo similarity clustering with real-time progress and bounded concurrency."""
 
+import aiohttp
 import asyncio
+import csv
 import json
 import logging
-import pandas as pd
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Tuple
 
 from src.config import Config
 from src.logo_extractor import LogoExtractor
@@ -27,69 +32,147 @@ class LogoSimilarityPipeline:
     def __init__(self, config: Config = None):
         self.config = config or Config()
         self.config.ensure_dirs()
+        # Process pool for CPU-bound image decode + hashing; the event loop
+        # keeps the network I/O while workers use the other cores.
+        self.executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+        # Shared by extractor and processor so the logo download reuses DNS
+        # entries and warm connections from the HTML fetch; created lazily in
+        # run() because the connector binds to the running event loop.
+        self.connector: aiohttp.TCPConnector = None
         self.stats = {
             'total_domains': 0,
             'logos_extracted': 0,
             'logos_processed': 0,
         }
     
-    async def extract_all_logos(self, domains: List[str]) -> Dict[str, str]:
+    def iter_domain_batches(self, input_file: str) -> Iterable[List[str]]:
+        """Stream domain batches from a parquet file without materializing the column."""
+        pf = pq.ParquetFile(input_file)
+        for batch in pf.iter_batches(batch_size=self.config.BATCH_SIZE, columns=['domain']):
+            yield batch.column('domain').to_pylist()
+
+    async def extract_all_logos(
+        self, domain_batches: Iterable[List[str]], total_domains: int
+    ) -> Dict[str, str]:
         """Extract logo URLs from all domains with per-batch progress."""
-        logger.info(f"Extracting logos from {len(domains)} domains...")
+        logger.info(f"Extracting logos from {total_domains} domains...")
         logo_urls: Dict[str, str] = {}
-        total_batches = (len(domains) + self.config.BATCH_SIZE - 1) // self.config.BATCH_SIZE
+        total_batches = (total_domains + self.config.BATCH_SIZE - 1) // self.config.BATCH_SIZE
 
-        async with LogoExtractor(self.config) as extractor:
+        async with LogoExtractor(self.config, connector=self.connector) as extractor:
             with tqdm(total=total_batches, desc="Extracting (batches)", unit="batch") as pbar:
-                for i in range(0, len(domains), self.config.BATCH_SIZE):
-                    batch = domains[i:i + self.config.BATCH_SIZE]
-                    batch_num = i // self.config.BATCH_SIZE + 1
+                for batch_num, batch in enumerate(domain_batches, start=1):
                     logger.info(f"Processing batch {batch_num}/{total_batches}")
                     batch_results = await extractor.extract_batch(batch)
                     logo_urls.update(batch_results)
 
-                    self.stats['logos_extracted'] = sum(1 for url in logo_urls.values() if url)
+                    self.stats['logos_extracted'] += sum(1 for url in batch_results.values() if url)
                     pbar.set_postfix(extracted=self.stats['logos_extracted'])
                     pbar.update(1)
                     await asyncio.sleep(0.2)
-        
-        logger.info(f"Extracted {self.stats['logos_extracted']}/{len(domains)} logos "
-                    f"({(self.stats['logos_extracted']/len(domains)*100 if domains else 0):.1f}%)")
+
+        logger.info(f"Extracted {self.stats['logos_extracted']}/{total_domains} logos "
+                    f"({(self.stats['logos_extracted']/total_domains*100 if total_domains else 0):.1f}%)")
         return logo_urls
     
     async def process_all_images(self, logo_urls: Dict[str, str]) -> Dict[str, Dict]:
-        """Process all logo images and compute hashes with bounded concurrency and chunking."""
+        """Process all logo images with a fixed pool of workers pulling from a queue."""
         logger.info(f"Processing {len(logo_urls)} logo images...")
         logo_data: Dict[str, Dict] = {}
         items: List[Tuple[str, str]] = [(d, u) for d, u in logo_urls.items() if u]
-        sem = asyncio.Semaphore(self.config.MAX_CONCURRENT)
-        chunk_size = getattr(self.config, "HASH_CHUNK_SIZE", 300)
-
-        async with ImageProcessor(self.config) as processor:
-            async def worker(domain: str, url: str):
-                async with sem:
-                    try:
-                        data = await processor.process_logo(url)
-                        return domain, data
-                    except Exception as e:
-                        logger.debug(f"Failed to process {domain}: {e}")
-                        return domain, None
-
-            processed = 0
-            for j in range(0, len(items), chunk_size):
-                chunk = items[j:j + chunk_size]
-                tasks = [worker(d, u) for d, u in chunk]
-                for coro in tqdm(asyncio.as_completed(tasks), total=len(chunk), desc="Hashing (images)", unit="img"):
-                    domain, data = await coro
-                    if data:
-                        logo_data[domain] = data
-                        processed += 1
+        processed = 0
+
+        n_workers = self.config.MAX_CONCURRENT
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in items:
+            queue.put_nowait(item)
+        # One sentinel per worker; each worker exits when it drains one.
+        for _ in range(n_workers):
+            queue.put_nowait(None)
+
+        async with ImageProcessor(
+            self.config, executor=self.executor, connector=self.connector
+        ) as processor:
+            with tqdm(total=len(items), desc="Hashing (images)", unit="img") as pbar:
+                async def worker():
+                    nonlocal processed
+                    while True:
+                        item = await queue.get()
+                        if item is None:
+                            return
+                        domain, url = item
+                        try:
+                            data = await processor.process_logo(url)
+                            if data:
+                                logo_data[domain] = data
+                                processed += 1
+                        except Exception as e:
+                            logger.debug(f"Failed to process {domain}: {e}")
+                        finally:
+                            pbar.update(1)
+
+                # The worker count itself bounds concurrency; the TaskGroup
+                # waits for all workers and cancels the rest on error/Ctrl-C.
+                async with asyncio.TaskGroup() as tg:
+                    for _ in range(n_workers):
+                        tg.create_task(worker())
 
         self.stats['logos_processed'] = processed
         logger.info(f"Successfully processed {processed}/{len(items)} logos "
                     f"({(processed/len(items)*100 if items else 0):.1f}%)")
         return logo_data
     
+    def _checkpoint_path(self, name: str) -> Path:
+        return Path(self.config.DATA_DIR) / name
+
+    def _checkpoint_is_fresh(self, path: Path, input_file: str) -> bool:
+        """A checkpoint is usable if it exists and is newer than the input."""
+        return path.exists() and path.stat().st_mtime > os.path.getmtime(input_file)
+
+    def save_logo_urls_checkpoint(self, logo_urls: Dict[str, str]) -> None:
+        """Checkpoint extracted logo URLs so a crash later doesn't redo extraction."""
+        path = self._checkpoint_path('logo_urls.parquet')
+        table = pa.table({
+            'domain': list(logo_urls),
+            'url': list(logo_urls.values()),
+        })
+        pq.write_table(table, path, compression='snappy')
+        logger.info(f"Checkpointed {table.num_rows} logo URLs to {path}")
+
+    def load_logo_urls_checkpoint(self) -> Dict[str, str]:
+        table = pq.read_table(self._checkpoint_path('logo_urls.parquet'))
+        return dict(zip(table.column('domain').to_pylist(), table.column('url').to_pylist()))
+
+    def save_logo_data_checkpoint(self, logo_data: Dict[str, Dict]) -> None:
+        """Checkpoint hashed logo data so clustering can be re-run offline."""
+        path = self._checkpoint_path('logo_data.parquet')
+        domains = list(logo_data)
+        table = pa.table({
+            'domain': domains,
+            'url': [logo_data[d]['url'] for d in domains],
+            'phash_u64': pa.array(
+                [logo_data[d]['hashes']['phash'] for d in domains], type=pa.uint64()
+            ),
+            'width': [logo_data[d]['size'][0] for d in domains],
+            'height': [logo_data[d]['size'][1] for d in domains],
+            'format': [logo_data[d]['format'] for d in domains],
+        })
+        pq.write_table(table, path, compression='snappy')
+        logger.info(f"Checkpointed {table.num_rows} hashed logos to {path}")
+
+    def load_logo_data_checkpoint(self) -> Dict[str, Dict]:
+        table = pq.read_table(self._checkpoint_path('logo_data.parquet'))
+        rows = table.to_pylist()
+        return {
+            row['domain']: {
+                'url': row['url'],
+                'hashes': {'phash': row['phash_u64']},
+                'size': (row['width'], row['height']),
+                'format': row['format'],
+            }
+            for row in rows
+        }
+
     def cluster_logos(self, logo_data: Dict[str, Dict]):
         """Cluster logos by similarity."""
         logger.info("Clustering logos by similarity...")
@@ -111,33 +194,61 @@ class LogoSimilarityPipeline:
         with open(output_dir / 'clusters.json', 'w', encoding='utf-8') as f:
             json.dump(clusters_json, f, indent=2)
         
-        rows = []
-        for i, cluster in enumerate(clusters):
-            for domain in cluster:
-                rows.append({
-                    'cluster_id': i,
-                    'domain': domain,
-                    'logo_url': logo_data.get(domain, {}).get('url', ''),
-                    'cluster_size': len(cluster)
-                })
-        pd.DataFrame(rows).to_csv(output_dir / 'clusters.csv', index=False)
-        
+        n_rows = 0
+        with open(output_dir / 'clusters.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['cluster_id', 'domain', 'logo_url', 'cluster_size'])
+            for i, cluster in enumerate(clusters):
+                size = len(cluster)
+                for domain in cluster:
+                    writer.writerow((i, domain, logo_data.get(domain, {}).get('url', ''), size))
+                    n_rows += 1
+
         with open(output_dir / 'statistics.json', 'w', encoding='utf-8') as f:
             json.dump(self.stats, f, indent=2)
-        
+
         logger.info(f"- clusters.json: {len(clusters)} clusters")
-        logger.info(f"- clusters.csv: {len(rows)} domain-cluster mappings")
+        logger.info(f"- clusters.csv: {n_rows} domain-cluster mappings")
     
     async def run(self, input_file: str):
         logger.info("Logo Similarity Clustering Pipeline")
         logger.info("="*59)
         logger.info(f"Loading domains from {input_file}...")
-        df = pd.read_parquet(input_file)
-        domains = df['domain'].tolist()
-        self.stats['total_domains'] = len(domains)
-        logger.info(f"Loaded {len(domains)} domains")
-        logo_urls = await self.extract_all_logos(domains)
-        logo_data = await self.process_all_images(logo_urls)
+        # Only the row count comes from metadata; batches stream lazily so
+        # extraction starts before the whole column is materialized.
+        total_domains = pq.ParquetFile(input_file).metadata.num_rows
+        self.stats['total_domains'] = total_domains
+        logger.info(f"Found {total_domains} domains")
+        if self._checkpoint_is_fresh(self._checkpoint_path('logo_data.parquet'), input_file):
+            logger.info("Resuming from logo_data checkpoint; skipping extraction and hashing")
+            logo_data = self.load_logo_data_checkpoint()
+            self.stats['logos_extracted'] = len(logo_data)
+            self.stats['logos_processed'] = len(logo_data)
+            self.executor.shutdown()
+        else:
+            self.connector = aiohttp.TCPConnector(
+                limit=self.config.MAX_CONCURRENT * 2,
+                limit_per_host=self.config.MAX_CONCURRENT,
+                ttl_dns_cache=300,
+                use_dns_cache=True,
+                enable_cleanup_closed=True,
+                resolver=aiohttp.AsyncResolver(),
+            )
+            try:
+                if self._checkpoint_is_fresh(self._checkpoint_path('logo_urls.parquet'), input_file):
+                    logger.info("Resuming from logo_urls checkpoint; skipping extraction")
+                    logo_urls = self.load_logo_urls_checkpoint()
+                    self.stats['logos_extracted'] = sum(1 for u in logo_urls.values() if u)
+                else:
+                    logo_urls = await self.extract_all_logos(
+                        self.iter_domain_batches(input_file), total_domains
+                    )
+                    self.save_logo_urls_checkpoint(logo_urls)
+                logo_data = await self.process_all_images(logo_urls)
+                self.save_logo_data_checkpoint(logo_data)
+            finally:
+                await self.connector.close()
+                self.executor.shutdown()
         clusters = self.cluster_logos(logo_data)
         self.save_results(clusters, logo_data)
         logger.info("="*59)
@@ -154,7 +265,6 @@ def main():
     parser.add_argument('--input', default='logos.snappy.parquet', help='Input parquet file')
     parser.add_argument('--batch-size', type=int, default=None, help='Batch size (overrides config)')
     parser.add_argument('--max-concurrent', type=int, default=None, help='Max concurrent requests (overrides config)')
-    parser.add_argument('--hash-chunk-size', type=int, default=None, help='Hash scheduling chunk size (overrides config)')
     parser.add_argument('--output', type=str, default=None, help='Output directory (overrides config)')
     args = parser.parse_args()
 
@@ -163,8 +273,6 @@ def main():
         config.BATCH_SIZE = args.batch_size
     if args.max_concurrent is not None:
         config.MAX_CONCURRENT = args.max_concurrent
-    if args.hash_chunk_size is not None:
-        config.HASH_CHUNK_SIZE = args.hash_chunk_size
     if args.output is not None:
         config.OUTPUT_DIR = args.output
 
@@ -1,53 +1,108 @@
 """Clustering module using graph-based approach without ML algorithms."""
 import logging
-from typing import Dict, List, Set
-import networkx as nx
-import imagehash
+from collections import defaultdict
+from typing import Dict, Iterator, List, Set, Tuple
+import numpy as np
 from src.config import Config
 
 logger = logging.getLogger(__name__)
 
+class _UnionFind:
+    """Array-based disjoint-set over integer indices with path compression."""
+
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, i: int, j: int) -> None:
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            self.parent[rj] = ri
+
 class Clusterer:
     """Cluster logos based on perceptual hash similarity using graph theory."""
-    
+
+    HASH_BITS = 64
+
     def __init__(self, config: Config = None):
         self.config = config or Config()
-    
-    def _compute_hash_distance(self, hash1: str, hash2: str) -> int:
-        """Compute Hamming distance between two perceptual hashes."""
-        try:
-            h1 = imagehash.hex_to_hash(hash1)
-            h2 = imagehash.hex_to_hash(hash2)
-            return h1 - h2
-        except Exception as e:
-            logger.error(f"Error computing hash distance: {e}")
-            return 999
-    
+
+    def _find_similar_pairs(self, hashes: np.ndarray) -> Iterator[Tuple[int, int]]:
+        """Yield index pairs whose Hamming distance is within the threshold.
+
+        Uses multi-index hashing: the 64-bit hash is split into threshold+1
+        segments, so any pair within the threshold must agree on at least one
+        segment (pigeonhole). Only pairs sharing a segment bucket are verified
+        with a popcount, avoiding the O(N^2) scan over all pairs.
+        """
+        threshold = self.config.NEAR_DUPLICATE_THRESHOLD
+        n_segments = threshold + 1
+        seg_bits = self.HASH_BITS // n_segments
+        values = [int(h) for h in hashes]
+
+        buckets: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for idx, value in enumerate(values):
+            for seg in range(n_segments):
+                # The last segment absorbs any leftover high bits.
+                shift = seg * seg_bits
+                if seg == n_segments - 1:
+                    key = value >> shift
+                else:
+                    key = (value >> shift) & ((1 << seg_bits) - 1)
+                buckets[(seg, key)].append(idx)
+
+        seen: Set[Tuple[int, int]] = set()
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            for a_pos, i in enumerate(members):
+                for j in members[a_pos + 1:]:
+                    pair = (i, j)
+                    if pair in seen:
+                        continue
+                    seen.add(pair)
+                    if (values[i] ^ values[j]).bit_count() <= threshold:
+                        yield pair
+
     def cluster_by_similarity(self, logo_data: Dict[str, Dict]) -> List[Set[str]]:
-        """Cluster domains by logo similarity using graph-based approach."""
-        G = nx.Graph()
-        
+        """Cluster domains by logo similarity via union-find over similar pairs."""
         valid_domains = [
             domain for domain, data in logo_data.items()
-            if data and 'hashes' in data and data['hashes'].get('phash')
+            if data and 'hashes' in data and data['hashes'].get('phash') is not None
         ]
-        
+
         logger.info(f"Clustering {len(valid_domains)} domains with valid logo hashes")
-        
+
+        # Byte-identical logos are common (shared favicons, CDN-hosted
+        # images); dedupe on the exact phash first and run the pair search
+        # only over unique hash representatives. phash is a uint64 int;
+        # hex strings are still accepted for older stored data.
+        buckets: Dict[int, List[str]] = defaultdict(list)
         for domain in valid_domains:
-            G.add_node(domain)
-        
-        for i, domain1 in enumerate(valid_domains):
-            hash1 = logo_data[domain1]['hashes']['phash']
-            
-            for domain2 in valid_domains[i+1:]:
-                hash2 = logo_data[domain2]['hashes']['phash']
-                distance = self._compute_hash_distance(hash1, hash2)
-                
-                if distance <= self.config.NEAR_DUPLICATE_THRESHOLD:
-                    G.add_edge(domain1, domain2, distance=distance)
-        
-        clusters = list(nx.connected_components(G))
+            phash = logo_data[domain]['hashes']['phash']
+            value = int(phash, 16) if isinstance(phash, str) else int(phash)
+            buckets[value].append(domain)
+        unique_hashes = list(buckets)
+        logger.info(f"{len(unique_hashes)} unique hashes among {len(valid_domains)} domains")
+
+        uf = _UnionFind(len(unique_hashes))
+        if unique_hashes:
+            hashes = np.fromiter(unique_hashes, dtype=np.uint64, count=len(unique_hashes))
+            for i, j in self._find_similar_pairs(hashes):
+                uf.union(i, j)
+
+        components: Dict[int, Set[str]] = defaultdict(set)
+        for idx, phash in enumerate(unique_hashes):
+            components[uf.find(idx)].update(buckets[phash])
+
+        clusters = list(components.values())
         logger.info(f"Found {len(clusters)} clusters")
-        
+
         return clusters
@@ -10,15 +10,17 @@ class Config:
     RETRY_DELAY = 0.5           
     BATCH_SIZE = 100            #
     MAX_CONCURRENT = 20        
-    HASH_CHUNK_SIZE = 200
 
     # Hamming distance
     EXACT_MATCH_THRESHOLD = 0
     NEAR_DUPLICATE_THRESHOLD = 5
     SIMILAR_THRESHOLD = 10
 
-    NORMALIZE_SIZE = 64
+    NORMALIZE_SIZE = 32         # matches the 32x32 DCT input phash uses internally
     MIN_IMAGE_SIZE = 16
+    MAX_IMAGE_BYTES = 5 * 1024 * 1024   # reject bodies larger than this
+    MAX_BUFFERED_DOWNLOADS = 8          # image bodies buffered in memory at once
+    COMPUTE_EXTRA_HASHES = False  # dhash/ahash/whash; clustering only needs phash
 
     OUTPUT_DIR = "output"
     DATA_DIR = "data"
@@ -1,30 +1,58 @@
 """Image processing and hashing module."""
+import asyncio
 import io
 import logging
-from typing import Optional, Dict
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Optional, Dict, Tuple
 from PIL import Image
-import imagehash
+import numpy as np
+import scipy.fft
 import aiohttp
 from src.config import Config
+from src.utils import DiskCache
 
 logger = logging.getLogger(__name__)
 
 class ImageProcessor:
     """Process and hash logo images."""
-    
-    def __init__(self, config: Config = None):
+
+    def __init__(
+        self,
+        config: Config = None,
+        executor: Optional[Executor] = None,
+        connector: Optional[aiohttp.TCPConnector] = None,
+    ):
         self.config = config or Config()
+        # Optional process pool for the CPU-bound decode/hash step; when not
+        # provided, decoding runs inline on the event-loop thread.
+        self.executor = executor
         self.session: Optional[aiohttp.ClientSession] = None
-    
+        # Optional shared connector (see main.py); when passed, the session
+        # does not own it and closing the session leaves it usable.
+        self.connector = connector
+        # 'logos-v2': entries with the old imagehash hex strings are not
+        # comparable to the inlined DCT hash and must not be mixed in.
+        self.cache = DiskCache(Path(self.config.CACHE_DIR) / 'logos-v2')
+
     async def __aenter__(self):
         """Setup async context."""
         timeout = aiohttp.ClientTimeout(total=self.config.TIMEOUT)
-        connector = aiohttp.TCPConnector(
-            limit=self.config.MAX_CONCURRENT,
-            limit_per_host=self.config.MAX_CONCURRENT,
-            enable_cleanup_closed=True
-        )
-        self.session = aiohttp.ClientSession(timeout=timeout, connector=connector)
+        if self.connector is not None:
+            self.session = aiohttp.ClientSession(
+                timeout=timeout, connector=self.connector, connector_owner=False
+            )
+        else:
+            connector = aiohttp.TCPConnector(
+                limit=self.config.MAX_CONCURRENT,
+                limit_per_host=self.config.MAX_CONCURRENT,
+                enable_cleanup_closed=True
+            )
+            self.session = aiohttp.ClientSession(timeout=timeout, connector=connector)
+        # Limits how many response bodies are buffered in memory at once;
+        # requests can be in flight, but reads wait for a permit.
+        self._read_sem = asyncio.Semaphore(self.config.MAX_BUFFERED_DOWNLOADS)
+        self.cache.load()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -32,20 +60,50 @@ class ImageProcessor:
         if self.session:
             await self.session.close()
     
-    async def download_image(self, url: str) -> Optional[Image.Image]:
-        """Download and load an image from URL."""
+    async def download_image_data(
+        self, url: str, validators: Optional[Dict] = None
+    ) -> Tuple[Optional[bytes], Optional[Dict], bool]:
+        """Download raw image bytes from URL, bounding buffered memory.
+
+        Returns (body, validators, not_modified). When cached validators are
+        passed the request is conditional; a 304 yields (None, validators,
+        True) and the caller should reuse its cached result.
+
+        The body is only read once a buffer permit is granted, so at most
+        MAX_BUFFERED_DOWNLOADS full images sit in memory at a time, and any
+        body exceeding MAX_IMAGE_BYTES is dropped without buffering it whole.
+        """
+        headers = {}
+        if validators:
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
         try:
-            async with self.session.get(url) as response:
+            async with self.session.get(url, headers=headers or None) as response:
+                if response.status == 304:
+                    return None, validators, True
                 if response.status != 200:
-                    return None
-                image_data = await response.read()
-                img = Image.open(io.BytesIO(image_data))
-                if not self._validate_image(img):
-                    return None
-                return img
+                    return None, None, False
+                length = response.content_length
+                if length is not None and length > self.config.MAX_IMAGE_BYTES:
+                    logger.debug(f"Skipping oversized image ({length} bytes) from {url}")
+                    return None, None, False
+                new_validators = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                }
+                async with self._read_sem:
+                    buf = io.BytesIO()
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        buf.write(chunk)
+                        if buf.tell() > self.config.MAX_IMAGE_BYTES:
+                            logger.debug(f"Skipping oversized image (no length header) from {url}")
+                            return None, None, False
+                    return buf.getvalue(), new_validators, False
         except Exception as e:
             logger.debug(f"Failed to download image from {url}: {e}")
-            return None
+            return None, None, False
     
     def _validate_image(self, img: Image.Image) -> bool:
         """Validate image meets requirements."""
@@ -61,32 +119,82 @@ class ImageProcessor:
 
         if img.mode == 'P':
             img = img.convert('RGBA').convert('RGB')
-        img = img.resize((self.config.NORMALIZE_SIZE, self.config.NORMALIZE_SIZE), Image.Resampling.LANCZOS)
+        # BILINEAR is much cheaper than LANCZOS and phash is robust to the
+        # resampling filter at this size.
+        img = img.resize((self.config.NORMALIZE_SIZE, self.config.NORMALIZE_SIZE), Image.Resampling.BILINEAR)
         return img
     
-    def compute_hashes(self, img: Image.Image) -> Dict[str, str]:
-        """Compute multiple perceptual hashes for an image."""
+    def compute_hashes(self, img: Image.Image) -> Dict:
+        """Compute perceptual hashes for an image.
+
+        Only phash is computed by default: it is the only hash the clusterer
+        reads, and the extras (whash in particular) dominate per-image cost.
+        Set COMPUTE_EXTRA_HASHES in the config to restore the full set
+        (requires the optional imagehash package).
+        """
         normalized = self.normalize_image(img)
-        return {
-            'phash': str(imagehash.phash(normalized)),
-            'dhash': str(imagehash.dhash(normalized)),
-            'ahash': str(imagehash.average_hash(normalized)),
-            'whash': str(imagehash.whash(normalized)),
-        }
+        gray = np.asarray(normalized.convert('L'), dtype=np.float32)
+        hashes = {'phash': _phash_u64(gray)}
+        if getattr(self.config, 'COMPUTE_EXTRA_HASHES', False):
+            import imagehash
+            hashes.update({
+                'dhash': str(imagehash.dhash(normalized)),
+                'ahash': str(imagehash.average_hash(normalized)),
+                'whash': str(imagehash.whash(normalized)),
+            })
+        return hashes
     
     async def process_logo(self, url: str) -> Optional[Dict]:
-        """Download and process a logo image."""
-        img = await self.download_image(url)
-        if not img:
+        """Download and process a logo image, reusing cached results on 304."""
+        cached = self.cache.get(url)
+        image_data, validators, not_modified = await self.download_image_data(
+            url, cached.get('validators') if cached else None
+        )
+        if not_modified and cached:
+            return cached['result']
+        if not image_data:
             return None
         try:
-            hashes = self.compute_hashes(img)
-            return {
-                'url': url,
-                'hashes': hashes,
-                'size': img.size,
-                'format': img.format,
-            }
+            # Decode + hash are CPU-bound and hold the GIL, so run them in the
+            # process pool when one is available; only bytes cross the pipe.
+            if self.executor is not None:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(
+                    self.executor, _decode_and_hash, image_data, self.config
+                )
+            else:
+                result = _decode_and_hash(image_data, self.config)
+            if not result:
+                return None
+            result['url'] = url
+            if validators and any(validators.values()):
+                self.cache.set(url, {'validators': validators, 'result': result})
+            return result
         except Exception as e:
             logger.error(f"Failed to process image from {url}: {e}")
             return None
+
+def _phash_u64(gray: np.ndarray) -> int:
+    """64-bit perceptual hash of a grayscale array via 2D DCT low frequencies.
+
+    Returns a plain int so results store as 8 bytes (or a JSON number in the
+    disk cache) instead of a hex string needing decode on every comparison.
+    """
+    dct = scipy.fft.dctn(gray, norm='ortho')[:8, :8]
+    median = np.median(dct[1:])
+    return int.from_bytes(np.packbits(dct > median), 'big')
+
+def _decode_and_hash(image_data: bytes, config: Config) -> Optional[Dict]:
+    """Decode raw image bytes and compute hashes.
+
+    Top-level so it can run in a worker process via ProcessPoolExecutor.
+    """
+    processor = ImageProcessor(config)
+    img = Image.open(io.BytesIO(image_data))
+    if not processor._validate_image(img):
+        return None
+    return {
+        'hashes': processor.compute_hashes(img),
+        'size': img.size,
+        'format': img.format,
+    }
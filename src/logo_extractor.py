@@ -2,33 +2,72 @@
 import aiohttp
 import asyncio
 import logging
-import warnings
 from typing import Optional, Dict, List
-from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
+from lxml import etree, html as lxml_html
+from pathlib import Path
 from src.config import Config
-from src.utils import normalize_url, is_valid_image_url
+from src.utils import DiskCache, get_domain_from_url, normalize_url, is_valid_image_url
 import random
 
-warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
-
 logger = logging.getLogger(__name__)
 
+_UPPER = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_LOWER = 'abcdefghijklmnopqrstuvwxyz'
+
+# XPath expressions compiled once at import; evaluated in document priority
+# order (rel icons, then meta images, then <img> tags with logo hints).
+_ICON_LINK_XPATH = etree.XPath(
+    f"//link[contains(translate(@rel, '{_UPPER}', '{_LOWER}'), 'icon')]/@href"
+)
+_META_IMAGE_XPATH = etree.XPath(
+    "//meta[@property='og:image' or @name='og:image'"
+    " or @property='twitter:image' or @name='twitter:image'"
+    " or @property='twitter:image:src' or @name='twitter:image:src']/@content"
+)
+_LOGO_IMG_XPATH = etree.XPath(
+    f"//img[contains(translate(concat(@alt, ' ', @class, ' ', @id),"
+    f" '{_UPPER}', '{_LOWER}'), 'logo')"
+    f" or contains(translate(concat(@alt, ' ', @class, ' ', @id),"
+    f" '{_UPPER}', '{_LOWER}'), 'brand')]/@src"
+)
+
 class LogoExtractor:
     """Extract logos from websites using multiple strategies."""
     
-    def __init__(self, config: Config = None):
+    def __init__(self, config: Config = None, connector: Optional[aiohttp.TCPConnector] = None):
         self.config = config or Config()
         self.session: Optional[aiohttp.ClientSession] = None
-        
+        # Optional shared connector (see main.py); when passed, the session
+        # does not own it and closing the session leaves it usable.
+        self.connector = connector
+        self.cache = DiskCache(Path(self.config.CACHE_DIR) / 'pages')
+        # One prebuilt header dict per user agent; _get_headers hands these
+        # out by reference, so callers must copy before mutating.
+        self._header_variants = [
+            {
+                'User-Agent': ua,
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+                'Accept-Language': 'en-US,en;q=0.5',
+            }
+            for ua in self.config.USER_AGENTS
+        ]
+        self._host_ua: Dict[str, int] = {}
+
     async def __aenter__(self):
         """Setup async context."""
         timeout = aiohttp.ClientTimeout(total=self.config.TIMEOUT)
-        connector = aiohttp.TCPConnector(
-            limit=self.config.MAX_CONCURRENT,           # total connections cap
-            limit_per_host=self.config.MAX_CONCURRENT,  # keep simple cap per host too
-            enable_cleanup_closed=True
-        )
-        self.session = aiohttp.ClientSession(timeout=timeout, connector=connector)
+        if self.connector is not None:
+            self.session = aiohttp.ClientSession(
+                timeout=timeout, connector=self.connector, connector_owner=False
+            )
+        else:
+            connector = aiohttp.TCPConnector(
+                limit=self.config.MAX_CONCURRENT,           # total connections cap
+                limit_per_host=self.config.MAX_CONCURRENT,  # keep simple cap per host too
+                enable_cleanup_closed=True
+            )
+            self.session = aiohttp.ClientSession(timeout=timeout, connector=connector)
+        self.cache.load()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -36,13 +75,15 @@ class LogoExtractor:
         if self.session:
             await self.session.close()
     
-    def _get_headers(self) -> Dict[str, str]:
-        """Get request headers with random user agent."""
-        return {
-            'User-Agent': random.choice(self.config.USER_AGENTS),
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-        }
+    def _get_headers(self, url: str = None) -> Dict[str, str]:
+        """Get prebuilt request headers; the user agent is sticky per host."""
+        if url:
+            host = get_domain_from_url(url)
+            idx = self._host_ua.get(host)
+            if idx is None:
+                idx = self._host_ua[host] = random.randrange(len(self._header_variants))
+            return self._header_variants[idx]
+        return random.choice(self._header_variants)
     
     async def extract_logo_url(self, domain: str) -> Optional[str]:
         """Extract logo URL from a domain using multiple strategies."""
@@ -64,45 +105,39 @@ class LogoExtractor:
             return f"{base_url}/favicon.ico"
     
     async def _extract_from_html(self, base_url: str) -> Optional[str]:
-        """Extract logo from HTML parsing."""
+        """Extract logo from HTML parsing, reusing cached results on 304."""
+        cached = self.cache.get(base_url)
+        headers = self._get_headers(base_url)
+        if cached:
+            validators = cached.get('validators', {})
+            conditional = {}
+            if validators.get('etag'):
+                conditional['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                conditional['If-Modified-Since'] = validators['last_modified']
+            if conditional:
+                headers = {**headers, **conditional}
         try:
-            async with self.session.get(base_url, headers=self._get_headers()) as response:
+            async with self.session.get(base_url, headers=headers) as response:
+                if response.status == 304 and cached:
+                    return cached['logo_url']
                 if response.status != 200:
                     return None
                 html = await response.text()
-                try:
-                    soup = BeautifulSoup(html, 'lxml')
-                except Exception:
-                    soup = BeautifulSoup(html, 'html.parser')
-                
-                # <link> rel icons
-                for rel in ['icon', 'shortcut icon', 'apple-touch-icon', 'apple-touch-icon-precomposed']:
-                    link = soup.find('link', rel=lambda x: x and rel in x.lower())
-                    if link and link.get('href'):
-                        url = normalize_url(link['href'], base_url)
-                        if is_valid_image_url(url):
-                            return url
-                
-                # meta image
-                for prop in ['og:image', 'twitter:image', 'twitter:image:src']:
-                    meta = soup.find('meta', property=prop) or soup.find('meta', attrs={'name': prop})
-                    if meta and meta.get('content'):
-                        url = normalize_url(meta['content'], base_url)
-                        if is_valid_image_url(url):
-                            return url
-                
-                # <img> with logo hints
-                for img in soup.find_all('img'):
-                    alt = (img.get('alt') or '').lower()
-                    if any(k in alt for k in ['logo', 'brand']):
-                        url = normalize_url(img.get('src'), base_url)
-                        if is_valid_image_url(url):
-                            return url
-                    classes = ' '.join(img.get('class', [])).lower()
-                    id_attr = (img.get('id') or '').lower()
-                    if any(k in classes + id_attr for k in ['logo', 'brand', 'header-logo', 'site-logo']):
-                        url = normalize_url(img.get('src'), base_url)
+                validators = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                }
+                tree = lxml_html.fromstring(html)
+                for xpath in (_ICON_LINK_XPATH, _META_IMAGE_XPATH, _LOGO_IMG_XPATH):
+                    for candidate in xpath(tree):
+                        url = normalize_url(candidate, base_url)
                         if is_valid_image_url(url):
+                            if any(validators.values()):
+                                self.cache.set(base_url, {
+                                    'validators': validators,
+                                    'logo_url': url,
+                                })
                             return url
                 return None
         except Exception as e:
@@ -110,7 +145,7 @@ class LogoExtractor:
             return None
     
     async def _try_common_paths(self, base_url: str) -> Optional[str]:
-        """Try common logo paths."""
+        """Probe common logo paths concurrently; return the highest-priority hit."""
         common_paths = [
             '/logo.png', '/logo.svg',
             '/assets/logo.png', '/assets/logo.svg',
@@ -118,15 +153,19 @@ class LogoExtractor:
             '/static/logo.png', '/static/images/logo.png',
             '/wp-content/uploads/logo.png',
         ]
-        for path in common_paths:
-            url = f"{base_url}{path}"
+        headers = self._get_headers(base_url)
+
+        async def probe(url: str) -> bool:
             try:
-                async with self.session.head(url, headers=self._get_headers(), allow_redirects=True) as response:
-                    if response.status == 200:
-                        return url
+                async with self.session.head(url, headers=headers, allow_redirects=True) as response:
+                    return response.status == 200
             except Exception:
-                continue
-        return None
+                return False
+
+        urls = [f"{base_url}{path}" for path in common_paths]
+        results = await asyncio.gather(*(probe(url) for url in urls))
+        # common_paths is ordered by preference; take the first success.
+        return next((url for url, ok in zip(urls, results) if ok), None)
     
     async def extract_batch(self, domains: List[str]) -> Dict[str, Optional[str]]:
         """Extract logos from multiple domains concurrently."""
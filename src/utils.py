@@ -1,7 +1,51 @@
 """Utility functions for logo similarity project."""
+import hashlib
+import json
 import logging
+import re
+from pathlib import Path
 from urllib.parse import urljoin, urlparse
-from typing import Optional
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class DiskCache:
+    """Small JSON-file cache: one file per key under a directory.
+
+    Entries are bulk-loaded into memory with load(); set() updates both the
+    in-memory dict and the backing file, so lookups never touch disk during
+    a run while results survive across runs.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._entries: Dict[str, dict] = {}
+
+    @staticmethod
+    def _key(name: str) -> str:
+        return hashlib.sha1(name.encode('utf-8')).hexdigest()
+
+    def load(self) -> None:
+        """Load all cached entries from disk."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for path in self.directory.glob('*.json'):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self._entries[path.stem] = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.debug(f"Skipping unreadable cache file {path}: {e}")
+
+    def get(self, name: str) -> Optional[dict]:
+        return self._entries.get(self._key(name))
+
+    def set(self, name: str, value: dict) -> None:
+        key = self._key(name)
+        self._entries[key] = value
+        try:
+            with open(self.directory / f'{key}.json', 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+        except OSError as e:
+            logger.debug(f"Failed to persist cache entry for {name}: {e}")
 
 def setup_logging(level=logging.INFO):
     """Configure logging for the application."""
@@ -41,30 +85,23 @@ def normalize_url(url: str, base_url: str) -> Optional[str]:
     # Handle relative URLs
     return urljoin(base_url, url)
 
+# Image extension at the end of the path (optionally followed by a query or
+# fragment), or a logo/icon keyword anywhere in the URL.
+_IMG_URL_RE = re.compile(
+    r'\.(?:png|jpe?g|gif|ico|svg|webp)(?:$|[?#])|logo|icon|favicon', re.I
+)
+
 def is_valid_image_url(url: str) -> bool:
     """
     Check if a URL appears to be a valid image URL.
-    
+
     Args:
         url: The URL to validate
-        
+
     Returns:
         True if URL appears to be for an image
     """
-    if not url:
-        return False
-    
-    valid_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.ico', '.svg', '.webp'}
-    parsed = urlparse(url.lower())
-    
-    for ext in valid_extensions:
-        if parsed.path.endswith(ext):
-            return True
-    
-    if any(keyword in parsed.path.lower() for keyword in ['logo', 'icon', 'favicon']):
-        return True
-    
-    return False
+    return bool(url and _IMG_URL_RE.search(url))
 
 def get_domain_from_url(url: str) -> str:
     """Extract domain from URL."""